@@ -1,15 +1,29 @@
 ﻿from __future__ import annotations
 
-import json
+import hashlib
+import io
 import os
+import re
+import time
 from datetime import datetime, timedelta, timezone
 from pathlib import Path
-from typing import Any
-
-from flask import Flask, abort, flash, g, jsonify, redirect, render_template, request, session, url_for
-from werkzeug.security import check_password_hash, generate_password_hash
-
-from models import db, Account, Interaction
+from typing import Any, NamedTuple
+
+from argon2 import PasswordHasher
+from argon2.exceptions import InvalidHashError, VerificationError
+import click
+import docx as _docx
+import orjson
+from flask import Flask, Response, abort, flash, g, jsonify, redirect, render_template, request, send_file, session, url_for
+from flask.json.provider import JSONProvider
+from fpdf import FPDF
+from fpdf.errors import FPDFException
+from pdfminer.high_level import extract_text as _pdf_extract
+from sqlalchemy import delete, event, func, select, text
+from werkzeug.datastructures import FileStorage
+from werkzeug.security import check_password_hash
+
+from models import db, Account, Interaction, RubricVersion
 from feedback_tech import generate_feedback
 from rubric_extract import extract_rubric_from_text
 
@@ -18,112 +32,290 @@ ROOT = Path(__file__).resolve().parent
 DATA_DIR = ROOT / "data"
 DATA_DIR.mkdir(parents=True, exist_ok=True)
 RUBRIC_PATH = DATA_DIR / "rubric.json"
+PDF_CACHE_DIR = DATA_DIR / "pdf_cache"
+PDF_CACHE_TTL_SECONDS = 7 * 24 * 3600
+
+
+def _prune_pdf_cache() -> None:
+    # drop rendered PDFs past the TTL; runs when a new one is written, so the directory stays bounded
+    cutoff = time.time() - PDF_CACHE_TTL_SECONDS
+    try:
+        entries = list(os.scandir(PDF_CACHE_DIR))
+    except OSError:
+        return
+    for entry in entries:
+        try:
+            if entry.stat().st_mtime < cutoff:
+                os.unlink(entry.path)
+        except OSError:
+            pass
 
 
 def _load_json(path: Path, default: Any) -> Any:
+    # plain fd read: one fstat + one read, no buffered file object
     try:
-        if path.exists():
-            return json.loads(path.read_text(encoding="utf-8"))
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return default
+    try:
+        return orjson.loads(os.read(fd, os.fstat(fd).st_size))
     except Exception:
-        pass
-    return default
-
-
-def _dump_json(path: Path, obj: Any) -> None:
-    path.write_text(json.dumps(obj, ensure_ascii=False, indent=2), encoding="utf-8")
-
-
-DEFAULT_TECH_RUBRIC = [
-    {
-        "name": "Executive Summary",
-        "scoringCriteria": [
-            {"points": 4, "description": "Clear problem, approach, key results, and recommendations."},
-            {"points": 3, "description": "Mostly clear; minor gaps in results or recommendations."},
-            {"points": 2, "description": "Important elements missing or unclear."},
-            {"points": 1, "description": "Confusing or lacks core content."},
-            {"points": 0, "description": "Absent or unusable."}
-        ],
-    },
-    {
-        "name": "Context: Puerto Rico",
-        "scoringCriteria": [
-            {"points": 4, "description": "Explicitly addresses PR-specific constraints (infrastructure, climate, regulations)."},
-            {"points": 3, "description": "Mentions PR context with moderate specificity."},
-            {"points": 2, "description": "Superficial references to PR context."},
-            {"points": 1, "description": "Vague or generic context."},
-            {"points": 0, "description": "No PR context."}
-        ],
-    },
-    {
-        "name": "Process Description & Flows",
-        "scoringCriteria": [
-            {"points": 5, "description": "Accurate process overview with flowrates, units, and assumptions."},
-            {"points": 4, "description": "Solid description; minor missing values or units."},
-            {"points": 3, "description": "Some process elements unclear or inconsistent."},
-            {"points": 2, "description": "Major gaps; unclear flows or units."},
-            {"points": 0, "description": "Not described."}
-        ],
-    },
-    {
-        "name": "Safety & Environmental",
-        "scoringCriteria": [
-            {"points": 4, "description": "Identifies hazards, mitigations, emissions, and compliance requirements."},
-            {"points": 3, "description": "Covers most safety/env factors; minor omissions."},
-            {"points": 2, "description": "Superficial; limited mitigations or compliance details."},
-            {"points": 1, "description": "Vague mention without specifics."},
-            {"points": 0, "description": "No discussion."}
-        ],
-    },
-    {
-        "name": "Economic Analysis",
-        "scoringCriteria": [
-            {"points": 4, "description": "Uses reasonable CAPEX/OPEX, sensitivity, and assumptions."},
-            {"points": 3, "description": "Basic costs; limited sensitivity or assumptions."},
-            {"points": 2, "description": "Rough estimates; unclear basis."},
-            {"points": 1, "description": "Inconsistent or unsupported economics."},
-            {"points": 0, "description": "Absent."}
-        ],
-    },
-    {
-        "name": "Data, Methods, and Rigor",
-        "scoringCriteria": [
-            {"points": 5, "description": "Credible data cited; methods reproducible; units and references consistent."},
-            {"points": 4, "description": "Mostly credible/reproducible; few inconsistencies."},
-            {"points": 3, "description": "Some gaps in data sources or methods."},
-            {"points": 2, "description": "Sparse citations; unclear methods."},
-            {"points": 0, "description": "No sources or methods."}
-        ],
-    },
-    {
-        "name": "Figures, Tables, and Formatting",
-        "scoringCriteria": [
-            {"points": 3, "description": "Legible figures/tables with captions and references in text."},
-            {"points": 2, "description": "Mostly legible; inconsistent captions or references."},
-            {"points": 1, "description": "Cluttered or unlabeled visuals."},
-            {"points": 0, "description": "No usable visuals."}
-        ],
-    },
-    {
-        "name": "Writing Quality",
-        "scoringCriteria": [
-            {"points": 3, "description": "Clear, concise, and well-organized with minimal errors."},
-            {"points": 2, "description": "Generally clear; some errors or structure issues."},
-            {"points": 1, "description": "Frequent errors; hard to follow."},
-            {"points": 0, "description": "Unclear or unreadable."}
-        ],
-    }
-]
+        return default
+    finally:
+        os.close(fd)
+
+
+# Default rubric kept as raw JSON; it seeds the rubric file verbatim and is parsed once
+_DEFAULT_RUBRIC_BYTES: bytes = b"""[
+  {
+    "name": "Executive Summary",
+    "scoringCriteria": [
+      {"points": 4, "description": "Clear problem, approach, key results, and recommendations."},
+      {"points": 3, "description": "Mostly clear; minor gaps in results or recommendations."},
+      {"points": 2, "description": "Important elements missing or unclear."},
+      {"points": 1, "description": "Confusing or lacks core content."},
+      {"points": 0, "description": "Absent or unusable."}
+    ]
+  },
+  {
+    "name": "Context: Puerto Rico",
+    "scoringCriteria": [
+      {"points": 4, "description": "Explicitly addresses PR-specific constraints (infrastructure, climate, regulations)."},
+      {"points": 3, "description": "Mentions PR context with moderate specificity."},
+      {"points": 2, "description": "Superficial references to PR context."},
+      {"points": 1, "description": "Vague or generic context."},
+      {"points": 0, "description": "No PR context."}
+    ]
+  },
+  {
+    "name": "Process Description & Flows",
+    "scoringCriteria": [
+      {"points": 5, "description": "Accurate process overview with flowrates, units, and assumptions."},
+      {"points": 4, "description": "Solid description; minor missing values or units."},
+      {"points": 3, "description": "Some process elements unclear or inconsistent."},
+      {"points": 2, "description": "Major gaps; unclear flows or units."},
+      {"points": 0, "description": "Not described."}
+    ]
+  },
+  {
+    "name": "Safety & Environmental",
+    "scoringCriteria": [
+      {"points": 4, "description": "Identifies hazards, mitigations, emissions, and compliance requirements."},
+      {"points": 3, "description": "Covers most safety/env factors; minor omissions."},
+      {"points": 2, "description": "Superficial; limited mitigations or compliance details."},
+      {"points": 1, "description": "Vague mention without specifics."},
+      {"points": 0, "description": "No discussion."}
+    ]
+  },
+  {
+    "name": "Economic Analysis",
+    "scoringCriteria": [
+      {"points": 4, "description": "Uses reasonable CAPEX/OPEX, sensitivity, and assumptions."},
+      {"points": 3, "description": "Basic costs; limited sensitivity or assumptions."},
+      {"points": 2, "description": "Rough estimates; unclear basis."},
+      {"points": 1, "description": "Inconsistent or unsupported economics."},
+      {"points": 0, "description": "Absent."}
+    ]
+  },
+  {
+    "name": "Data, Methods, and Rigor",
+    "scoringCriteria": [
+      {"points": 5, "description": "Credible data cited; methods reproducible; units and references consistent."},
+      {"points": 4, "description": "Mostly credible/reproducible; few inconsistencies."},
+      {"points": 3, "description": "Some gaps in data sources or methods."},
+      {"points": 2, "description": "Sparse citations; unclear methods."},
+      {"points": 0, "description": "No sources or methods."}
+    ]
+  },
+  {
+    "name": "Figures, Tables, and Formatting",
+    "scoringCriteria": [
+      {"points": 3, "description": "Legible figures/tables with captions and references in text."},
+      {"points": 2, "description": "Mostly legible; inconsistent captions or references."},
+      {"points": 1, "description": "Cluttered or unlabeled visuals."},
+      {"points": 0, "description": "No usable visuals."}
+    ]
+  },
+  {
+    "name": "Writing Quality",
+    "scoringCriteria": [
+      {"points": 3, "description": "Clear, concise, and well-organized with minimal errors."},
+      {"points": 2, "description": "Generally clear; some errors or structure issues."},
+      {"points": 1, "description": "Frequent errors; hard to follow."},
+      {"points": 0, "description": "Unclear or unreadable."}
+    ]
+  }
+]"""
+
+DEFAULT_TECH_RUBRIC = orjson.loads(_DEFAULT_RUBRIC_BYTES)
+
+
+def _write_rubric(body: bytes) -> None:
+    # temp file + rename, so concurrent readers see either the old or the new rubric, never a partial one
+    tmp = RUBRIC_PATH.with_suffix(f".{os.getpid()}.tmp")
+    tmp.write_bytes(body)
+    os.replace(tmp, RUBRIC_PATH)
+
 
 if not RUBRIC_PATH.exists():
-    _dump_json(RUBRIC_PATH, DEFAULT_TECH_RUBRIC)
+    _write_rubric(_DEFAULT_RUBRIC_BYTES)
+
+
+class _RubricSnapshot(NamedTuple):
+    mtime: int
+    data: Any
+    body: bytes
+    etag: str
+
+
+# Parsed rubric plus its serialized response body, rebuilt only when the file's mtime changes.
+# Always replaced whole (never mutated), so a request that grabbed a snapshot keeps a consistent
+# data/body/etag even if another thread saves or invalidates the rubric meanwhile
+_RUBRIC_CACHE: _RubricSnapshot | None = None
+
+
+def _rubric_cache() -> _RubricSnapshot:
+    global _RUBRIC_CACHE
+    try:
+        mtime = os.stat(RUBRIC_PATH).st_mtime_ns
+    except OSError:
+        mtime = 0
+    snap = _RUBRIC_CACHE
+    if snap is None or snap.mtime != mtime:
+        data = _load_json(RUBRIC_PATH, None) if mtime else None
+        if data is not None:
+            body = orjson.dumps(data)
+        else:
+            # missing or unreadable: serve the default but leave mtime unset so the next request re-reads
+            data, body, mtime = DEFAULT_TECH_RUBRIC, _DEFAULT_RUBRIC_BYTES, 0
+        snap = _RubricSnapshot(mtime, data, body, hashlib.blake2b(body, digest_size=8).hexdigest())
+        _RUBRIC_CACHE = snap
+    return snap
+
+
+def _load_rubric() -> Any:
+    return _rubric_cache().data
+
+
+def _invalidate_rubric_cache() -> None:
+    global _RUBRIC_CACHE
+    _RUBRIC_CACHE = None
+
+
+# Non-Latin-1 punctuation -> ASCII stand-ins for the PDF core fonts
+_LATIN1_TABLE = str.maketrans({
+    '\u2013': '-', '\u2014': '-',  # en/em dash
+    '\u2018': "'", '\u2019': "'",  # single quotes
+    '\u201C': '"', '\u201D': '"',  # double quotes
+    '\u2026': '...',               # ellipsis
+    '\u00A0': ' ',                 # nbsp
+})
+
+
+# Placeholder body for PDFs of interactions without feedback text
+_HAS_OPENAI_KEY = bool(os.getenv("OPENAI_API_KEY", "").strip())
+_NO_FEEDBACK_HINT = "No feedback available yet." + ("" if _HAS_OPENAI_KEY else " LLM offline (no OPENAI_API_KEY).")
+
+# Every full 50-char run inside a longer token (tokens split on spaces/newlines)
+_LONG_TOKEN_RE = re.compile(r'([^ \n]{50})(?=[^ \n])')
+
+
+def _pdf_sanitize(s: str) -> str:
+    # map punctuation, break long tokens every 50 chars so multi_cell can wrap them,
+    # then keep only the latin-1 range
+    if not s:
+        return ""
+    return _LONG_TOKEN_RE.sub(r'\1 ', s.translate(_LATIN1_TABLE)).encode('latin-1', 'ignore').decode('latin-1')
+
+
+LOGIN_MAX_FAILURES = 5
+LOGIN_LOCKOUT_SECONDS = 900
+
+# Argon2id tuned to roughly 30 ms per hash; older werkzeug (pbkdf2/scrypt) hashes
+# still verify and are upgraded on the next successful login
+_PH = PasswordHasher(time_cost=2, memory_cost=65536, parallelism=2)
+_DUMMY_PW_HASH: str | None = None
+
+
+def _hash_password(password: str) -> str:
+    return _PH.hash(password)
+
+
+def _verify_password(stored: str, password: str) -> bool:
+    if stored.startswith("$argon2"):
+        try:
+            return _PH.verify(stored, password)
+        except (VerificationError, InvalidHashError):
+            return False
+    return check_password_hash(stored, password)
+
+
+def _password_needs_rehash(stored: str) -> bool:
+    return not stored.startswith("$argon2") or _PH.check_needs_rehash(stored)
+
+
+def _dummy_pw_hash() -> str:
+    # verified against for unknown usernames so they cost the same as a wrong password
+    global _DUMMY_PW_HASH
+    if _DUMMY_PW_HASH is None:
+        _DUMMY_PW_HASH = _hash_password(os.urandom(16).hex())
+    return _DUMMY_PW_HASH
+
+
+SQLITE_PRAGMAS = (
+    "journal_mode=WAL",  # readers no longer block on a writer
+    "synchronous=NORMAL",
+    "temp_store=MEMORY",
+    "mmap_size=268435456",
+)
+
+
+def _set_sqlite_pragmas(dbapi_conn: Any, _conn_record: Any) -> None:
+    cur = dbapi_conn.cursor()
+    for pragma in SQLITE_PRAGMAS:
+        cur.execute(f"PRAGMA {pragma}")
+    cur.close()
+
+
+def _extract_upload_text(f: FileStorage) -> str:
+    """Read text from an uploaded PDF/DOCX/TXT straight off the request stream ("" on failure)."""
+    fname = (f.filename or "").lower()
+    try:
+        if fname.endswith(".pdf"):
+            return _pdf_extract(f.stream) or ""
+        if fname.endswith(".docx"):
+            doc = _docx.Document(f.stream)
+            return "\n".join(p.text for p in doc.paragraphs)
+        return io.TextIOWrapper(f.stream, encoding="utf-8", errors="ignore").read()
+    except Exception:
+        return ""
+
+
+class OrjsonProvider(JSONProvider):
+    """Serve jsonify()/request.get_json() through orjson."""
+
+    def dumps(self, obj: Any, **kwargs: Any) -> str:
+        return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS).decode()
+
+    def loads(self, s: str | bytes, **kwargs: Any) -> Any:
+        return orjson.loads(s)
+
+    def response(self, *args: Any, **kwargs: Any) -> Response:
+        # hand orjson's bytes straight to the response instead of str -> bytes again
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(
+            orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS), mimetype="application/json"
+        )
 
 
 def create_app() -> Flask:
     app = Flask(__name__)
+    app.json = OrjsonProvider(app)
     app.config.update(
         SECRET_KEY=os.getenv("SECRET_KEY", "dev-secret"),
-        JSON_AS_ASCII=False,
         PERMANENT_SESSION_LIFETIME=timedelta(days=14),
+        # reject oversized uploads with 413 before the body is buffered
+        MAX_CONTENT_LENGTH=int(os.getenv("MAX_UPLOAD_MB", "25")) * 1024 * 1024,
     )
 
     db_url = os.getenv("DATABASE_URL")
@@ -134,50 +326,164 @@ def create_app() -> Flask:
     instance_dir = ROOT / "instance"
     instance_dir.mkdir(exist_ok=True)
     sqlite_path = instance_dir / "app.db"
+    db_uri = db_url or f"sqlite:///{sqlite_path}"
+    is_sqlite = db_uri.startswith("sqlite")
+
+    engine_options: dict[str, Any] = {
+        "pool_pre_ping": True,
+        "pool_recycle": 300,
+        # SQLAlchemy 2.0 engine; compiled statements are cached and reused across requests
+        "future": True,
+        "query_cache_size": 1200,
+        # JSON/JSONB columns (Interaction.scores_json) round-trip through orjson
+        "json_serializer": lambda obj: orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS).decode(),
+        "json_deserializer": orjson.loads,
+    }
+    if db_uri.startswith("postgresql"):
+        # psycopg2 fast-execution helpers for multi-row INSERT/UPDATE
+        engine_options["executemany_mode"] = "values_plus_batch"
+    elif is_sqlite:
+        # gunicorn threads may hand a pooled SQLite connection to another thread
+        engine_options["connect_args"] = {"check_same_thread": False}
 
     app.config.update(
-        SQLALCHEMY_DATABASE_URI=db_url or f"sqlite:///{sqlite_path}",
+        SQLALCHEMY_DATABASE_URI=db_uri,
         SQLALCHEMY_TRACK_MODIFICATIONS=False,
-        SQLALCHEMY_ENGINE_OPTIONS={"pool_pre_ping": True, "pool_recycle": 300},
+        SQLALCHEMY_ENGINE_OPTIONS=engine_options,
         SESSION_COOKIE_HTTPONLY=True,
         SESSION_COOKIE_SAMESITE="Lax",
         SESSION_COOKIE_SECURE=True,
     )
 
-    db.init_app(app)
+    # behind a reverse proxy (Render), take the client address from X-Forwarded-For;
+    # login throttling keys on it, so it must not be the proxy's own address
+    proxy_hops = int(os.getenv("PROXY_FIX_HOPS", "0").strip() or 0)
+    if proxy_hops > 0:
+        from werkzeug.middleware.proxy_fix import ProxyFix
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=proxy_hops, x_proto=proxy_hops)
+
+    # server-side sessions when Redis is available; the cookie then carries only the session id
+    redis_url = os.getenv("REDIS_URL", "").strip()
+    redis_client = None
+    if redis_url:
+        import redis
+        from flask_session import Session
+        redis_client = redis.from_url(redis_url)
+        app.config.update(
+            SESSION_TYPE="redis",
+            SESSION_REDIS=redis_client,
+        )
+        Session(app)
 
-    with app.app_context():
-        db.create_all()
-        _maybe_seed_admin()
+    # optional background scoring: /get_feedback returns 202 and the RQ worker fills the row in
+    feedback_queue = None
+    if redis_client is not None and os.getenv("FEEDBACK_ASYNC", "").strip() == "1":
+        from rq import Queue
+        feedback_queue = Queue("feedback", connection=redis_client)
+
+    db.init_app(app)
+    if is_sqlite:
+        with app.app_context():
+            event.listen(db.engine, "connect", _set_sqlite_pragmas)
+
+    # schema + admin seed run once per deploy via `flask init-db`, not in every worker;
+    # RUN_DB_INIT=1 restores the old run-at-startup behaviour
+    if os.getenv("RUN_DB_INIT", "").strip() == "1":
+        with app.app_context():
+            _init_db()
+
+    @app.cli.command("init-db")
+    def init_db_command():
+        """Create missing tables and seed the admin account."""
+        _init_db()
+        click.echo("Database initialized.")
+
+    @app.errorhandler(413)
+    def _upload_too_large(_e):
+        return jsonify({"success": False, "error": "Uploaded file is too large."}), 413
 
     # ----- user/session helpers -----
-    @app.before_request
-    def _load_current_user():
-        g.current_user = None
-        uid = session.get("user_id")
-        if uid:
-            g.current_user = db.session.get(Account, uid)
+    def _current_user() -> Account | None:
+        # loaded on first use and kept on g, so requests that never ask skip the DB entirely
+        if "current_user" not in g:
+            uid = session.get("user_id")
+            g.current_user = db.session.get(Account, uid) if uid else None
+        return g.current_user
+
+    def _is_admin() -> bool:
+        # memoized on g so templates and admin checks share one role lookup
+        if "_is_admin" not in g:
+            cu = _current_user()
+            g._is_admin = bool(cu and getattr(cu, "role", "") == "admin")
+        return g._is_admin
 
     @app.context_processor
     def _inject_tpl_vars():
-        cu = getattr(g, "current_user", None)
         return {
-            "current_user": cu,
-            "is_admin": bool(cu and getattr(cu, "role", "") == "admin"),
+            "current_user": _current_user(),
+            "is_admin": _is_admin(),
         }
 
+    # compile the page templates now so the first request per worker skips the Jinja compile
+    with app.app_context():
+        for tpl in ("base.html", "index.html", "login.html", "register.html"):
+            app.jinja_env.get_template(tpl)
+
+    # ----- login throttling (Redis only) -----
+    def _login_fail_key(username: str) -> str:
+        # per (username, client address): guessing from one host can't lock the real owner out elsewhere
+        return f"login_fail:{username}:{request.remote_addr or '-'}"
+
+    def _login_locked(username: str) -> bool:
+        if redis_client is None:
+            return False
+        try:
+            return int(redis_client.get(_login_fail_key(username)) or 0) >= LOGIN_MAX_FAILURES
+        except Exception:
+            return False
+
+    def _note_login_failure(username: str) -> None:
+        if redis_client is None:
+            return
+        try:
+            key = _login_fail_key(username)
+            pipe = redis_client.pipeline()
+            pipe.incr(key)
+            pipe.expire(key, LOGIN_LOCKOUT_SECONDS)
+            pipe.execute()
+        except Exception:
+            pass
+
+    def _clear_login_failures(username: str) -> None:
+        if redis_client is None:
+            return
+        try:
+            redis_client.delete(_login_fail_key(username))
+        except Exception:
+            pass
+
     # ----- auth pages -----
     @app.route("/login", methods=["GET", "POST"])
     def login():
-        if "user_id" in session and db.session.get(Account, session["user_id"]):
+        if _current_user():
             return redirect(url_for("index"))
         if request.method == "POST":
             username = request.form.get("username", "").strip()
             password = request.form.get("password", "")
-            acc = Account.query.filter_by(username=username).first()
-            if acc is None or not check_password_hash(acc.password_hash, password):
+            if _login_locked(username):
+                flash("Too many failed attempts. Please try again later.", "danger")
+                return redirect(url_for("login"))
+            acc = db.session.execute(select(Account).where(Account.username == username)).scalar_one_or_none()
+            if acc is None:
+                _verify_password(_dummy_pw_hash(), password)
+            if acc is None or not _verify_password(acc.password_hash, password):
+                _note_login_failure(username)
                 flash("Invalid username or password.", "danger")
                 return redirect(url_for("login"))
+            _clear_login_failures(username)
+            if _password_needs_rehash(acc.password_hash):
+                acc.password_hash = _hash_password(password)
+                db.session.commit()
             session["user_id"] = acc.id
             session.permanent = True
             return redirect(url_for("index"))
@@ -201,10 +507,10 @@ def create_app() -> Flask:
             if password != confirm:
                 flash("Passwords do not match.", "danger")
                 return redirect(url_for("register"))
-            if Account.query.filter_by(username=username).first():
+            if db.session.execute(select(Account.id).where(Account.username == username)).first() is not None:
                 flash("Username already exists.", "danger")
                 return redirect(url_for("register"))
-            acc = Account(username=username, password_hash=generate_password_hash(password))
+            acc = Account(username=username, password_hash=_hash_password(password))
             db.session.add(acc)
             db.session.commit()
             flash("Registration successful. Please log in.", "success")
@@ -214,20 +520,21 @@ def create_app() -> Flask:
     # ----- pages -----
     @app.route("/")
     def index():
-        if not getattr(g, "current_user", None):
+        if not _current_user():
             return redirect(url_for("login"))
-        rubric = _load_json(RUBRIC_PATH, DEFAULT_TECH_RUBRIC)
+        rubric = _load_rubric()
         return render_template("index.html", rubric=rubric)
 
     # ----- rubric endpoints (compat with prior app) -----
     @app.get("/get_WRITING_RUBRICs")
     def get_rubrics():
-        rubric = _load_json(RUBRIC_PATH, DEFAULT_TECH_RUBRIC)
-        return jsonify(rubric)
+        cache = _rubric_cache()
+        resp = Response(cache.body, mimetype="application/json")
+        resp.set_etag(cache.etag)
+        return resp.make_conditional(request)
 
     def _admin_required() -> None:
-        cu = getattr(g, "current_user", None)
-        if not cu or getattr(cu, "role", "") != "admin":
+        if not _is_admin():
             abort(403)
 
     @app.post("/save_WRITING_RUBRICs")
@@ -237,12 +544,13 @@ def create_app() -> Flask:
             data = request.get_json(force=True)
             if not isinstance(data, list):
                 return jsonify({"error": "Body must be a JSON array of rubrics"}), 400
-            # Save to file
-            _dump_json(RUBRIC_PATH, data)
+            # Save to file; the same serialized text is stored as the version record
+            body = orjson.dumps(data, option=orjson.OPT_INDENT_2)
+            _write_rubric(body)
+            _invalidate_rubric_cache()
             # Versioning record
             try:
-                from models import RubricVersion
-                rv = RubricVersion(created_by=getattr(g.current_user, 'id', None), rubric_json=json.dumps(data, ensure_ascii=False))
+                rv = RubricVersion(created_by=getattr(g.current_user, 'id', None), rubric_json=body.decode())
                 db.session.add(rv)
                 db.session.commit()
             except Exception:
@@ -258,28 +566,7 @@ def create_app() -> Flask:
         f = request.files.get("file")
         if not f or not f.filename:
             return jsonify({"success": False, "error": "Please upload a syllabus file (PDF/DOCX/TXT)."}), 400
-        fname = f.filename.lower()
-        text = ""
-        try:
-            if fname.endswith(".pdf"):
-                from pdfminer.high_level import extract_text as _pdf_extract
-                import tempfile
-                with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as tmp:
-                    f.save(tmp.name)
-                    text = _pdf_extract(tmp.name) or ""
-            elif fname.endswith(".docx"):
-                import docx as _docx
-                import tempfile
-                with tempfile.NamedTemporaryFile(delete=False, suffix=".docx") as tmp:
-                    f.save(tmp.name)
-                    doc = _docx.Document(tmp.name)
-                    text = "\n".join(p.text for p in doc.paragraphs)
-            else:
-                text = f.read().decode("utf-8", "ignore")
-        except Exception:
-            text = text or ""
-
-        text = (text or "").strip()
+        text = _extract_upload_text(f).strip()
         if not text:
             return jsonify({"success": False, "error": "Could not read text from the uploaded file."}), 400
 
@@ -291,8 +578,9 @@ def create_app() -> Flask:
     @app.get("/rubric/versions")
     def rubric_versions():
         _admin_required()
-        from models import RubricVersion
-        rows = (RubricVersion.query.order_by(RubricVersion.created_at.desc()).limit(20).all())
+        rows = db.session.execute(
+            select(RubricVersion).order_by(RubricVersion.created_at.desc(), RubricVersion.id.desc()).limit(20)
+        ).scalars().all()
         return jsonify({
             "success": True,
             "versions": [
@@ -312,15 +600,15 @@ def create_app() -> Flask:
             vid = int(body.get("version_id"))
         except Exception:
             return jsonify({"success": False, "error": "version_id is required"}), 400
-        from models import RubricVersion
         r = db.session.get(RubricVersion, vid)
         if not r:
             return jsonify({"success": False, "error": "Version not found"}), 404
         try:
-            obj = json.loads(r.rubric_json)
+            orjson.loads(r.rubric_json)  # validate only; the stored text is written back as-is
         except Exception:
             return jsonify({"success": False, "error": "Stored version JSON invalid"}), 400
-        _dump_json(RUBRIC_PATH, obj)
+        _write_rubric(r.rubric_json.encode("utf-8"))
+        _invalidate_rubric_cache()
         # Also append a new version entry noting rollback
         try:
             rv = RubricVersion(created_by=getattr(g.current_user, 'id', None), rubric_json=r.rubric_json)
@@ -330,19 +618,34 @@ def create_app() -> Flask:
             db.session.rollback()
         return jsonify({"success": True, "message": "Rolled back to selected version"})
 
+    def _private_etag(resp: Response, etag: str) -> Response:
+        # per-user data: the browser may keep it but must revalidate; shared caches must not
+        resp.set_etag(etag)
+        resp.cache_control.private = True
+        resp.cache_control.no_cache = True
+        return resp.make_conditional(request)
+
     @app.get("/history")
     def history_list():
-        if not getattr(g, "current_user", None):
+        if not _current_user():
             abort(401)
-        rows = (Interaction.query
-                .filter(Interaction.user_id == g.current_user.id, Interaction.feedback_text.isnot(None))
-                .order_by(Interaction.feedback_time.desc())
-                .limit(30)
-                .all())
+        # let the DB cut the excerpts (one char past the limit so "..." still applies)
+        # instead of shipping full report/feedback blobs for 30 rows
+        rows = db.session.execute(
+            select(
+                Interaction.id,
+                Interaction.feedback_time,
+                func.substr(Interaction.prompt_text, 1, 161).label("prompt_text"),
+                func.substr(Interaction.feedback_text, 1, 161).label("feedback_text"),
+            )
+            .where(Interaction.user_id == g.current_user.id, Interaction.feedback_text.isnot(None))
+            .order_by(Interaction.feedback_time.desc())
+            .limit(30)
+        ).all()
         def excerpt(s: str, n: int = 160) -> str:
             s = (s or "")
             return (s[:n] + ("..." if len(s) > n else "")) if s else ""
-        return jsonify({
+        resp = jsonify({
             "success": True,
             "items": [
                 {
@@ -353,26 +656,32 @@ def create_app() -> Flask:
                 } for r in rows
             ]
         })
+        return _private_etag(resp, hashlib.blake2b(resp.get_data(), digest_size=8).hexdigest())
 
     @app.get("/history/<int:rid>")
     def history_detail(rid: int):
-        if not getattr(g, "current_user", None):
+        if not _current_user():
             abort(401)
         r = db.session.get(Interaction, rid)
         if (not r) or (r.user_id != g.current_user.id):
             abort(404)
-        return jsonify({
+        # the returned fields never change after insert, so id + feedback_time identify the body
+        etag = hashlib.blake2b(f"{r.id}:{r.feedback_time}".encode(), digest_size=8).hexdigest()
+        if request.if_none_match.contains(etag):
+            return _private_etag(Response(status=304), etag)
+        resp = jsonify({
             "success": True,
             "id": r.id,
             "feedback_time": (r.feedback_time.isoformat() if r.feedback_time else None),
             "prompt_text": r.prompt_text or "",
             "feedback_text": r.feedback_text or "",
-            "scores": json.loads(r.scores_json or "{}") if r.scores_json else {},
+            "scores": r.scores_json or {},
         })
+        return _private_etag(resp, etag)
 
     @app.get("/export_pdf")
     def export_pdf():
-        if not getattr(g, "current_user", None):
+        if not _current_user():
             abort(401)
         try:
             rid = int(request.args.get("interaction_id", "0"))
@@ -381,66 +690,41 @@ def create_app() -> Flask:
         r = db.session.get(Interaction, rid)
         if (not r) or (r.user_id != g.current_user.id):
             abort(404)
+        ts = r.feedback_time.isoformat() if r.feedback_time else ""
+        # Feedback rows are immutable once written, so the rendered PDF can be reused
+        cache_key = hashlib.sha1(f"{r.id}:{ts}".encode()).hexdigest()
+        cached_pdf = PDF_CACHE_DIR / f"{cache_key}.pdf"
+        try:
+            fresh = time.time() - cached_pdf.stat().st_mtime < PDF_CACHE_TTL_SECONDS
+        except OSError:
+            fresh = False
+        if fresh:
+            return send_file(
+                cached_pdf,
+                mimetype='application/pdf',
+                as_attachment=True,
+                download_name=f'feedback_{r.id}.pdf'
+            )
         # Build a simple PDF (wrap long tokens to avoid width errors)
-        from fpdf import FPDF
         pdf = FPDF()
         pdf.set_margins(12, 12, 12)
         pdf.set_auto_page_break(auto=True, margin=12)
         pdf.add_page()
         pdf.set_font('Helvetica', size=12)
-        # Helper to wrap very long tokens with soft breaks
-        def _wrap_for_pdf(s: str, max_token: int = 50) -> str:
-            if not s:
-                return ""
-            out_lines = []
-            for line in s.split('\n'):
-                parts = line.split(' ')
-                fixed_parts = []
-                for p in parts:
-                    if len(p) > max_token:
-                        # insert spaces every max_token chars to allow wrapping
-                        chunks = [p[i:i+max_token] for i in range(0, len(p), max_token)]
-                        fixed_parts.append(' '.join(chunks))
-                    else:
-                        fixed_parts.append(p)
-                out_lines.append(' '.join(fixed_parts))
-            return '\n'.join(out_lines)
-
-        # Replace non-Latin-1 punctuation and drop unsupported chars for core fonts
-        def _latin1_safe(s: str) -> str:
-            if not s:
-                return ""
-            repl = {
-                '\u2013': '-', '\u2014': '-',  # en/em dash
-                '\u2018': "'", '\u2019': "'",  # single quotes
-                '\u201C': '"', '\u201D': '"',  # double quotes
-                '\u2026': '...',               # ellipsis
-                '\u00A0': ' ',                 # nbsp
-            }
-            for k, v in repl.items():
-                s = s.replace(k, v)
-            # keep only latin-1 range
-            return s.encode('latin-1', 'ignore').decode('latin-1')
         title = "Technical Report Feedback"
         pdf.set_text_color(20, 20, 20)
         epw = pdf.w - pdf.l_margin - pdf.r_margin
         pdf.set_x(pdf.l_margin)
-        pdf.multi_cell(0, 8, _latin1_safe(title), align='L')
+        pdf.multi_cell(0, 8, _pdf_sanitize(title), align='L')
         pdf.set_text_color(80, 80, 80)
-        ts = r.feedback_time.isoformat() if r.feedback_time else ""
         pdf.set_x(pdf.l_margin)
-        pdf.multi_cell(0, 6, _latin1_safe(f"Time: {ts}"), align='L')
+        pdf.multi_cell(0, 6, _pdf_sanitize(f"Time: {ts}"), align='L')
         pdf.ln(2)
         pdf.set_text_color(20, 20, 20)
         txt = r.feedback_text or ""
         if not (txt.strip()):
-            hint = "No feedback available yet."
-            if not os.getenv("OPENAI_API_KEY", "").strip():
-                hint += " LLM offline (no OPENAI_API_KEY)."
-            txt = hint
-        from fpdf.errors import FPDFException
-        for para in (txt.split("\n") if txt else []):
-            ptext = _latin1_safe(_wrap_for_pdf(para))
+            txt = _NO_FEEDBACK_HINT
+        for ptext in _pdf_sanitize(txt).split("\n"):
             try:
                 pdf.set_x(pdf.l_margin)
                 pdf.multi_cell(0, 6, ptext, align='L')
@@ -457,68 +741,79 @@ def create_app() -> Flask:
                     pdf.multi_cell(0, 6, tight, align='L')
                 finally:
                     pdf.set_font('Helvetica', size=12)
-        out = pdf.output(dest='S')
-        if isinstance(out, str):
-            out = out.encode('latin1', 'ignore')
-        import io
-        from flask import send_file
-        return send_file(
-            io.BytesIO(out),
+        # fpdf2 renders straight to a bytearray; write it out and send it without re-wrapping
+        out = pdf.output()
+        try:
+            PDF_CACHE_DIR.mkdir(exist_ok=True)
+            tmp_pdf = cached_pdf.with_suffix(f".{os.getpid()}.tmp")
+            tmp_pdf.write_bytes(out)
+            os.replace(tmp_pdf, cached_pdf)
+        except OSError:
+            pass
+        _prune_pdf_cache()
+        return Response(
+            bytes(out),
             mimetype='application/pdf',
-            as_attachment=True,
-            download_name=f'feedback_{r.id}.pdf'
+            headers={'Content-Disposition': f'attachment; filename=feedback_{r.id}.pdf'},
         )
 
     # ----- feedback endpoints -----
     @app.get("/get_last_feedback")
     def get_last_feedback():
-        if not getattr(g, "current_user", None):
+        if not _current_user():
             abort(401)
-        rec = (
-            Interaction.query
-            .filter(Interaction.user_id == g.current_user.id, Interaction.feedback_text.isnot(None))
+        rec = db.session.execute(
+            select(Interaction)
+            .where(Interaction.user_id == g.current_user.id, Interaction.feedback_text.isnot(None))
             .order_by(Interaction.feedback_time.desc())
-            .first()
-        )
+            .limit(1)
+        ).scalar_one_or_none()
         return jsonify({"success": True, "feedback": rec.feedback_text if rec else ""})
 
     @app.post("/get_feedback")
     def post_get_feedback():
-        if not getattr(g, "current_user", None):
+        if not _current_user():
             abort(401)
 
         msg = request.form.get("message", "").strip()
         f = request.files.get("file")
 
-        uploaded_text = ""
-        if f and f.filename:
-            fname = f.filename.lower()
-            try:
-                if fname.endswith(".pdf"):
-                    from pdfminer.high_level import extract_text as _pdf_extract
-                    import tempfile
-                    with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as tmp:
-                        f.save(tmp.name)
-                        uploaded_text = _pdf_extract(tmp.name) or ""
-                elif fname.endswith(".docx"):
-                    import docx as _docx
-                    import tempfile
-                    with tempfile.NamedTemporaryFile(delete=False, suffix=".docx") as tmp:
-                        f.save(tmp.name)
-                        doc = _docx.Document(tmp.name)
-                        uploaded_text = "\n".join(p.text for p in doc.paragraphs)
-                else:
-                    uploaded_text = f.read().decode("utf-8", "ignore")
-            except Exception:
-                uploaded_text = uploaded_text or ""
+        uploaded_text = _extract_upload_text(f) if f and f.filename else ""
 
         narrative_text = msg or uploaded_text
 
-        rubric = _load_json(RUBRIC_PATH, DEFAULT_TECH_RUBRIC)
+        if feedback_queue is not None:
+            rec = Interaction(
+                user_id=g.current_user.id,
+                prompt_text=narrative_text or None,
+                prompt_time=datetime.now(timezone.utc),
+                status="pending",
+            )
+            db.session.add(rec)
+            db.session.flush()
+            rid = rec.id
+            db.session.commit()
+            try:
+                feedback_queue.enqueue("tasks.generate_feedback_task", rid, job_timeout=300)
+            except Exception as e:
+                # no worker will ever see this row; drop it and score inline below instead
+                app.logger.warning("feedback enqueue failed, scoring synchronously: %s", e)
+                db.session.execute(delete(Interaction).where(Interaction.id == rid))
+                db.session.commit()
+            else:
+                return jsonify({
+                    "success": True,
+                    "status": "pending",
+                    "interaction_id": rid,
+                    "prompt_excerpt": (narrative_text or "")[:4000],
+                }), 202
+
+        rubric = _load_rubric()
         try:
             feedback_text, scores, feedback_summary, evidence_quotes = generate_feedback(
                 message=narrative_text,
                 rubric=rubric,
+                owner=str(g.current_user.id),
             )
         except Exception:
             # Backward-compat if function returns only 3 values
@@ -526,17 +821,21 @@ def create_app() -> Flask:
             feedback_text, scores, feedback_summary = ft, sc, sm
             evidence_quotes = []
 
+        now = datetime.now(timezone.utc)
         rec = Interaction(
             user_id=g.current_user.id,
             prompt_text=narrative_text or None,
-            prompt_time=datetime.now(timezone.utc),
+            prompt_time=now,
             feedback_text=feedback_text,
             feedback_summary=feedback_summary,
-            feedback_time=datetime.now(timezone.utc),
-            scores_json=json.dumps(scores, ensure_ascii=False),
+            feedback_time=now,
+            scores_json=scores,
             status="final",
         )
         db.session.add(rec)
+        # take the id from the INSERT; reading rec.id after commit would re-SELECT the expired row
+        db.session.flush()
+        rid = rec.id
         db.session.commit()
 
         return jsonify({
@@ -545,13 +844,32 @@ def create_app() -> Flask:
             "feedback_summary": feedback_summary,
             "scores": scores,
             "evidence_quotes": evidence_quotes,
-            "interaction_id": rec.id,
+            "interaction_id": rid,
             "prompt_excerpt": (narrative_text or "")[:4000],
         })
 
+    @app.get("/feedback_status/<int:rid>")
+    def feedback_status(rid: int):
+        if not _current_user():
+            abort(401)
+        rec = db.session.get(Interaction, rid)
+        if (not rec) or (rec.user_id != g.current_user.id):
+            abort(404)
+        if rec.status == "pending":
+            return jsonify({"success": True, "status": "pending", "interaction_id": rec.id})
+        return jsonify({
+            "success": True,
+            "status": rec.status,
+            "feedback": rec.feedback_text or "",
+            "feedback_summary": rec.feedback_summary or "",
+            "scores": rec.scores_json or {},
+            "evidence_quotes": [],
+            "interaction_id": rec.id,
+        })
+
     @app.post("/submit_feedback")
     def submit_feedback():
-        if not getattr(g, "current_user", None):
+        if not _current_user():
             abort(401)
         try:
             data = request.get_json(force=True) or {}
@@ -559,18 +877,10 @@ def create_app() -> Flask:
             rating = data.get("rating")
             feedback = data.get("feedback")
 
-            rec = None
-            if interaction_id:
-                rec = db.session.get(Interaction, interaction_id)
-            if not rec:
-                # fallback to latest
-                rec = (
-                    Interaction.query
-                    .filter(Interaction.user_id == g.current_user.id)
-                    .order_by(Interaction.feedback_time.desc())
-                    .first()
-                )
-            if not rec:
+            if not interaction_id:
+                return jsonify({"success": False, "error": "interaction_id required"}), 400
+            rec = db.session.get(Interaction, int(interaction_id))
+            if not rec or rec.user_id != g.current_user.id:
                 return jsonify({"success": False, "error": "record not found"}), 404
 
             if rating is not None:
@@ -590,15 +900,42 @@ def create_app() -> Flask:
     return app
 
 
+def _init_db() -> None:
+    db.create_all()
+    _upgrade_schema()
+    _maybe_seed_admin()
+
+
+def _upgrade_schema() -> None:
+    """Bring databases created by older releases up to the current models; safe to re-run."""
+    # create_all() skips tables that already exist, so their newer indexes are added here
+    for table in db.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=db.engine, checkfirst=True)
+    if db.engine.dialect.name != "postgresql":
+        return
+    with db.engine.begin() as conn:
+        col_type = conn.execute(text(
+            "SELECT data_type FROM information_schema.columns "
+            "WHERE table_schema = current_schema() AND table_name = 'interaction' AND column_name = 'scores_json'"
+        )).scalar()
+        if col_type in ("text", "character varying", "json"):
+            conn.execute(text(
+                "ALTER TABLE interaction ALTER COLUMN scores_json TYPE jsonb "
+                "USING NULLIF(scores_json::text, '')::jsonb"
+            ))
+        conn.execute(text("CREATE INDEX IF NOT EXISTS ix_scores_gin ON interaction USING gin (scores_json)"))
+
+
 def _maybe_seed_admin() -> None:
     username = os.getenv("ADMIN_USERNAME", "").strip()
     password = os.getenv("ADMIN_PASSWORD", "").strip()
     if not username or not password:
         return
-    exists = Account.query.filter_by(username=username).first()
+    exists = db.session.execute(select(Account.id).where(Account.username == username)).first() is not None
     if exists:
         return
-    acc = Account(username=username, role="admin", password_hash=generate_password_hash(password))
+    acc = Account(username=username, role="admin", password_hash=_hash_password(password))
     db.session.add(acc)
     db.session.commit()
 
@@ -606,6 +943,8 @@ def _maybe_seed_admin() -> None:
 app = create_app()
 
 if __name__ == "__main__":
+    with app.app_context():
+        _init_db()
     app.run(host="127.0.0.1", port=5000, debug=True)
 
 
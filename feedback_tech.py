@@ -1,121 +1,163 @@
 from __future__ import annotations
 
-import json
+import asyncio
+import hashlib
 import os
+import time
+from functools import lru_cache
+from pathlib import Path
 from typing import Any, Dict, List, Tuple
 
-
-def _max_points_for_item(item: Dict[str, Any]) -> float:
-    mx = 0.0
-    # allow either explicit max_points or scoringCriteria array of {points}
-    if isinstance(item.get("max_points"), (int, float)):
-        return float(item.get("max_points"))
-    sc = item.get("scoringCriteria")
-    if isinstance(sc, list):
-        for entry in sc:
-            try:
-                mx = max(mx, float(entry.get("points") or 0))
-            except Exception:
-                pass
-    return mx
+import orjson
+
+from llm_cache import cache_key, cache_lookup, cache_mode, cache_store, semantic_enabled, semantic_lookup, semantic_store
+from llm_client import clip_tokens, get_client
+
+_TEMPERATURE = 0.2
+
+_NO_ROWS_TEXT = (
+    "**Technical Report Feedback (degraded)**\n"
+    "- The model returned no rubric scores. Returning structure-only scores; please try again.\n"
+)
+
+# Prompt budget for the report excerpt, in model tokens (about the old 8000-character cut)
+REPORT_TOKEN_BUDGET = 2000
+
+_OFFLINE_TEXT = (
+    "**Technical Report Feedback (offline mode)**\n"
+    "- LLM disabled (no OPENAI_API_KEY). Returning structure-only scores.\n\n"
+    "Focus areas:\n"
+    "- Ensure Puerto Rico-specific constraints are addressed (infrastructure, regulations, climate).\n"
+    "- Add units, flowrates, and assumptions; cite credible sources.\n"
+    "- Provide economic assumptions and a brief sensitivity check.\n"
+)
+
+# Static grading rules and output schema, serialized once into the system message so every
+# request shares the same prompt prefix (eligible for OpenAI prompt caching)
+_INSTRUCTIONS = [
+    "Score each rubric 0..max based on clarity, specificity, credibility, and structure.",
+    "Ground judgments strictly in the provided text; do not assume unstated facts.",
+    "Keep rationales <= 25 words; suggestions <= 16 words; be concrete.",
+    "Include 0-2 short evidence quotes when helpful.",
+]
+_OUTPUT_SCHEMA = {
+    "writing": [
+        {
+            "name": "string",
+            "score": "number (0..max for this rubric)",
+            "total": "number (the rubric max)",
+            "rationale": "string (<= 25 words)",
+            "suggestion": "string (<= 16 words)",
+            "evidence_quotes": ["string (0-2 quotes)"]
+        }
+    ],
+    "overall": {
+        "notes": "string (<= 120 words; action-oriented revision plan with 2–4 concrete steps)"
+    }
+}
+_SYS_TEXT = (
+    "You are a rigorous technical writing reviewer for chemical engineering. "
+    "Read holistically; judge based on evidence in the text; avoid keyword scoring. "
+    "Return ONLY a valid JSON object that matches the requested schema. Do not include any prose outside JSON."
+    "\n\nRULES:\n" + orjson.dumps({"instructions": _INSTRUCTIONS, "output_schema": _OUTPUT_SCHEMA}).decode()
+)
+
+
+def _rubric_key(rubric: List[Dict[str, Any]]) -> Tuple[Any, ...]:
+    # everything the max-points computation reads, as a hashable key for _compile_rubric
+    key = []
+    for r in rubric or []:
+        sc = r.get("scoringCriteria")
+        pts = tuple(e.get("points") if isinstance(e, dict) else None for e in sc) if isinstance(sc, list) else ()
+        key.append((r.get("name"), r.get("max_points"), pts))
+    return tuple(key)
+
+
+@lru_cache(maxsize=64)
+def _compile_rubric(key: Tuple[Any, ...]) -> Tuple[Tuple[Tuple[Any, float], ...], Tuple[Tuple[str, float], ...]]:
+    """Per rubric version: (name, max points) rows for the prompt, and named rows for the skeleton."""
+    view = []
+    for name, max_points, pts in key:
+        # allow either explicit max_points or scoringCriteria array of {points}
+        if isinstance(max_points, (int, float)):
+            mx = float(max_points)
+        else:
+            mx = 0.0
+            for p in pts:
+                try:
+                    mx = max(mx, float(p or 0))
+                except Exception:
+                    pass
+        view.append((name, mx))
+    skeleton = tuple((str(n or "").strip(), mx) for n, mx in view if str(n or "").strip())
+    return tuple(view), skeleton
+
+
+def _compiled_rubric(rubric: List[Dict[str, Any]]) -> Tuple[Tuple[Tuple[Any, float], ...], Tuple[Tuple[str, float], ...]]:
+    key = _rubric_key(rubric)
+    try:
+        return _compile_rubric(key)
+    except TypeError:
+        # unhashable values in a hand-edited rubric; compute without caching
+        return _compile_rubric.__wrapped__(key)
 
 
 def _build_scores_skeleton(rubric: List[Dict[str, Any]]) -> Dict[str, Any]:
-    d: Dict[str, Any] = {}
-    for r in rubric or []:
-        name = str(r.get("name") or "").strip()
-        if not name:
-            continue
-        d[name] = {"score": 0.0, "total": _max_points_for_item(r)}
-    return d
+    return {name: {"score": 0.0, "total": mx} for name, mx in _compiled_rubric(rubric)[1]}
 
 
-def generate_feedback(
-    message: str,
-    rubric: List[Dict[str, Any]],
-) -> Tuple[str, Dict[str, Any], str, List[str]]:
-    text = (message or "").strip()
-    if not text:
-        return (
-            "No report content provided. Please paste the technical report text or upload a file.",
-            _build_scores_skeleton(rubric),
-            "No content to evaluate.",
-            []
-        )
+def _semantic_namespace(owner: str, model: str, sys_text: str, rubric: List[Dict[str, Any]]) -> str:
+    # near-duplicate hits are only valid for the same model, prompt and rubric shape, and only
+    # within one owner: a hit replays the earlier report's quotes, which must not reach another user
+    shape = sorted((str(n or ""), mx) for n, mx in _compiled_rubric(rubric)[0])
+    return hashlib.sha256(orjson.dumps([owner, model, sys_text, shape])).hexdigest()
 
-    api_key = os.getenv("OPENAI_API_KEY", "").strip()
-    if not api_key:
-        feedback_text = (
-            "**Technical Report Feedback (offline mode)**\n"
-            "- LLM disabled (no OPENAI_API_KEY). Returning structure-only scores.\n\n"
-            "Focus areas:\n"
-            "- Ensure Puerto Rico-specific constraints are addressed (infrastructure, regulations, climate).\n"
-            "- Add units, flowrates, and assumptions; cite credible sources.\n"
-            "- Provide economic assumptions and a brief sensitivity check.\n"
+
+def _embed(client: Any, text: str) -> List[float] | None:
+    try:
+        resp = client.embeddings.create(
+            model=os.getenv("OPENAI_EMBED_MODEL", "text-embedding-3-small"),
+            input=text,
         )
-        return feedback_text, _build_scores_skeleton(rubric), "Model offline; no rubric scoring.", []
+        return list(resp.data[0].embedding)
+    except Exception:
+        return None
 
 
+def _build_messages(text: str, rubric: List[Dict[str, Any]]) -> Tuple[str, str]:
+    # only the per-request parts go in the user message; the rules live in _SYS_TEXT
     payload = {
-        "report_excerpt": text[:8000],
-        "rubrics": [{"name": r.get("name"), "max_points": _max_points_for_item(r)} for r in rubric],
-        "instructions": [
-            "Score each rubric 0..max based on clarity, specificity, credibility, and structure.",
-            "Ground judgments strictly in the provided text; do not assume unstated facts.",
-            "Keep rationales <= 25 words; suggestions <= 16 words; be concrete.",
-            "Include 0-2 short evidence quotes when helpful.",
-        ],
-        "output_schema": {
-            "writing": [
-                {
-                    "name": "string",
-                    "score": "number (0..max for this rubric)",
-                    "total": "number (the rubric max)",
-                    "rationale": "string (<= 25 words)",
-                    "suggestion": "string (<= 16 words)",
-                    "evidence_quotes": ["string (0-2 quotes)"]
-                }
-            ],
-            "overall": {
-                "notes": "string (<= 120 words; action-oriented revision plan with 2–4 concrete steps)"
-            }
-        }
+        "report_excerpt": clip_tokens(text, REPORT_TOKEN_BUDGET),
+        "rubrics": [{"name": n, "max_points": mx} for n, mx in _compiled_rubric(rubric)[0]],
     }
+    user_text = (
+        "Return a JSON object that strictly matches the output_schema. "
+        "The word json here indicates your output must be JSON.\n\nPayload:\n" + orjson.dumps(payload).decode()
+    )
+    return _SYS_TEXT, user_text
 
 
-    try:
-        from openai import OpenAI
-        client = OpenAI(api_key=api_key)
-        sys_text = (
-            "You are a rigorous technical writing reviewer for chemical engineering. "
-            "Read holistically; judge based on evidence in the text; avoid keyword scoring. "
-            "Return ONLY a valid JSON object that matches the requested schema. Do not include any prose outside JSON."
-        )
-        user_text = (
-            "Return a JSON object that strictly matches the output_schema. "
-            "The word json here indicates your output must be JSON.\n\nPayload:\n" + json.dumps(payload, ensure_ascii=False)
-        )
-        resp = client.chat.completions.create(
-            model=os.getenv("OPENAI_CHAT_MODEL", "gpt-4o-mini"),
-            response_format={"type": "json_object"},
-            messages=[
-                {"role": "system", "content": sys_text},
-                {"role": "user", "content": user_text},
-            ],
-            temperature=0.2,
-        )
-        content = resp.choices[0].message.content or "{}"
-        data = json.loads(content)
-    except Exception as e:
-        fb = f"**Technical Report Feedback (degraded)**\n- Error: {e}\nFalling back to structure-only scores.\n"
-        return fb, _build_scores_skeleton(rubric), "Model error; no scores.", []
+def _degraded_result(e: Exception, rubric: List[Dict[str, Any]]) -> Tuple[str, Dict[str, Any], str, List[str]]:
+    fb = f"**Technical Report Feedback (degraded)**\n- Error: {e}\nFalling back to structure-only scores.\n"
+    return fb, _build_scores_skeleton(rubric), "Model error; no scores.", []
+
 
+def _render_feedback(
+    data: Dict[str, Any],
+    rubric: List[Dict[str, Any]],
+) -> Tuple[str, Dict[str, Any], str, List[str]]:
     writing_rows = data.get("writing") or []
+    if not writing_rows:
+        notes = str((data.get("overall") or {}).get("notes") or "").strip()
+        return _NO_ROWS_TEXT, _build_scores_skeleton(rubric), notes, []
     evidence_quotes: List[str] = []
+    seen_quotes: set[str] = set()
     strict_env = os.getenv("EVIDENCE_STRICT", "1").strip().lower()
     strict_evidence = strict_env not in ("0", "false", "no")
 
-    earned, max_total = 0.0, 0.0
+    # parse each row once into (name, s, t, sug, rationale, quotes, ratio);
+    # totals, summary, priorities and the breakdown below all read from this list
+    parsed: List[Tuple[str, float, float, str, str, List[str], float]] = []
     scores: Dict[str, Any] = {}
 
     for w in writing_rows:
@@ -125,120 +167,299 @@ def generate_feedback(
                 continue
             s = float(w.get("score") or 0.0)
             t = float(w.get("total") or 0.0)
-            max_total += t
 
             quotes = [q for q in (w.get("evidence_quotes") or []) if isinstance(q, str)]
             if strict_evidence and s > 0 and not quotes:
                 s *= 0.8
                 w["score"] = s
 
-            earned += s
-            scores[name] = {"score": s, "total": t}
-
-            for q in quotes[:2]:
-                q_clean = q.strip()
-                if q_clean and q_clean not in evidence_quotes:
-                    evidence_quotes.append(q_clean)
+            sug = str(w.get("suggestion") or "").strip()
+            rationale = str(w.get("rationale") or "").strip()
         except Exception:
             continue
+        scores[name] = {"score": s, "total": t}
+        for q in quotes[:2]:
+            q_clean = q.strip()
+            if q_clean and q_clean not in seen_quotes:
+                seen_quotes.add(q_clean)
+                evidence_quotes.append(q_clean)
+        parsed.append((name, s, t, sug, rationale, quotes, (s / t) if t > 0 else 0.0))
+
+    earned = sum(p[1] for p in parsed)
+    max_total = sum(p[2] for p in parsed)
+    scored = [p for p in parsed if p[2] > 0]
+    # scored rows below 80%, weakest first (stable, so ties keep rubric order)
+    weak = sorted((p for p in scored if p[6] < 0.8), key=lambda p: p[6])
+    strong = [p for p in scored if p[6] >= 0.8]
+    top3 = weak[:3]
 
-
-    lines: List[str] = ["**Technical Report Feedback**"]
+    # every markdown line goes into one list, joined once at the end
+    out: List[str] = ["**Technical Report Feedback**"]
     if max_total > 0:
-        lines.append(f"**Total Score**: {earned:.1f}/{max_total:.1f}")
-    lines += ["", "**Overall Summary**"]
+        out.append(f"**Total Score**: {earned:.1f}/{max_total:.1f}")
+    out.extend(("", "**Overall Summary**"))
 
     # ---------- Overall Summary ----------
-    weak: List[Tuple[str, float, float, str]] = []
-    strong: List[Tuple[str, float, float]] = []
-    for w in writing_rows:
-        try:
-            n = (w.get("name") or "").strip()
-            s = float(w.get("score") or 0.0)
-            t = float(w.get("total") or 0.0)
-            if not t:
-                continue
-            if (s / t) < 0.8:
-                weak.append((n, s, t, (w.get("suggestion") or "").strip()))
-            else:
-                strong.append((n, s, t))
-        except Exception:
-            pass
-
-    weak.sort(key=lambda x: (x[1] / x[2]) if x[2] else 0.0)
-    top3 = weak[:3]
-
-    summary_lines: List[str] = [
+    out.append(
         f"Your draft scores **{earned:.1f}/{max_total:.1f}**. "
         "To make this grade-ready, tackle the items below **in order**."
-    ]
+    )
     if top3:
         steps = []
-        for (n, s, t, sug) in top3:
-            action = (sug or f"Strengthen {n} with concrete data/figures").rstrip(".")
-            steps.append(f"{n}: {action}")
-        summary_lines.append("**Revise in this order:** " + " → ".join(steps))
-    missing = [n for (n, s, t, _) in weak if s == 0]
+        for name, _, _, sug, _, _, _ in top3:
+            action = (sug or f"Strengthen {name} with concrete data/figures").rstrip(".")
+            steps.append(f"{name}: {action}")
+        out.append("**Revise in this order:** " + " → ".join(steps))
+    missing = [p[0] for p in weak if p[1] == 0]
     if missing:
-        summary_lines.append("**Missing sections:** " + ", ".join(missing[:5]))
+        out.append("**Missing sections:** " + ", ".join(missing[:5]))
     if strong:
-        summary_lines.append("**Highlights:** " + ", ".join(n for (n, _, _) in strong[:3]))
-
-    lines += ["\n".join(summary_lines), ""]
+        out.append("**Highlights:** " + ", ".join(p[0] for p in strong[:3]))
+    out.extend(("", ""))
 
     # ---------- Top Priorities + Per-Rubric Breakdown ----------
-    priorities = sorted(
-        (
-            (
-                (w.get("name") or "").strip(),
-                float(w.get("score") or 0.0),
-                float(w.get("total") or 0.0),
-                (w.get("suggestion") or "").strip(),
-            )
-            for w in writing_rows
-            if float(w.get("total") or 0.0) > 0.0
-        ),
-        key=lambda x: (x[1] / x[2]) if x[2] else 0.0
-    )
-    top = [p for p in priorities if p[2] > 0 and (p[1] / p[2]) < 0.8][:3]
+    if top3:
+        out.append("**Top Priorities (next steps)**")
+        for idx, (name, s, t, sug, _, _, _) in enumerate(top3, start=1):
+            out.append(f"{idx}. {name}: {s:.1f}/{t:.1f} — {sug}")
+        out.append("")
 
-    body: List[str] = []
-    if top:
-        body.append("**Top Priorities (next steps)**")
-        for idx, (name, s, t, sug) in enumerate(top, start=1):
-            body.append(f"{idx}. {name}: {s:.1f}/{t:.1f} — {sug}")
-        body.append("")
+    out.append("**Per-Rubric Breakdown**")
 
-    body.append("**Per-Rubric Breakdown**")
-    
-    for w in writing_rows:
-        try:
-            name = str(w.get("name") or "").strip()
-            s = float(w.get("score") or 0.0)
-            t = float(w.get("total") or 0.0)
-            rationale = str(w.get("rationale") or "").strip()
-            sug = str(w.get("suggestion") or "").strip()
-            ratio = (s / t) if t else 0.0
+    for name, s, t, sug, rationale, quotes, ratio in parsed:
+        out.append(f" **{name}**: {s:.1f}/{t:.1f}")
+        if ratio >= 0.8:
+            continue
+        #  Why / Improve / Evidence
+        if rationale:
+            out.append(f"  - **Why**: {rationale}")
+        if sug and sug.lower() != "none":
+            out.append(f"  - **Improve**: {sug}")
+        if quotes:
+            out.append("  - **Evidence**: " + " | ".join(f"“{q.strip()}”" for q in quotes[:2]))
+
+    final_text = "\n".join(out).strip()
+    summary = str((data.get("overall") or {}).get("notes") or "").strip() or ""
+    return final_text, (scores or _build_scores_skeleton(rubric)), summary, evidence_quotes
 
-            if ratio >= 0.8:
 
-                body.append(f" **{name}**: {s:.1f}/{t:.1f}")
-                continue
+def generate_feedback(
+    message: str,
+    rubric: List[Dict[str, Any]],
+    owner: str | None = None,
+) -> Tuple[str, Dict[str, Any], str, List[str]]:
+    """Score one report. owner (e.g. the user id) scopes the semantic cache; without it the cache is skipped."""
+    text = (message or "").strip()
+    if not text:
+        return (
+            "No report content provided. Please paste the technical report text or upload a file.",
+            _build_scores_skeleton(rubric),
+            "No content to evaluate.",
+            []
+        )
+
+    # replay answers from the response cache alone, so it also works on hosts without a key
+    api_key = os.getenv("OPENAI_API_KEY", "").strip()
+    if not api_key and cache_mode() != "replay":
+        return _OFFLINE_TEXT, _build_scores_skeleton(rubric), "Model offline; no rubric scoring.", []
+
+
+    sys_text, user_text = _build_messages(text, rubric)
+    semantic_ns: str | None = None
+    semantic_vec: List[float] | None = None
+    try:
+        model = os.getenv("OPENAI_CHAT_MODEL", "gpt-4o-mini")
+        temperature = _TEMPERATURE
+        # identical (model, prompt) pairs are answered from the local response cache
+        key = cache_key(model, temperature, sys_text, user_text)
+        content = cache_lookup(key)
+        fresh = content is None
+        if fresh:
+            client = get_client()
+            if owner and semantic_enabled():
+                # a lightly edited resubmission reuses the earlier result instead of a new completion
+                semantic_ns = _semantic_namespace(owner, model, sys_text, rubric)
+                semantic_vec = _embed(client, text[:8000])
+                if semantic_vec is not None:
+                    hit = semantic_lookup(semantic_ns, semantic_vec)
+                    if hit is not None:
+                        final_text, scores, summary, quotes = orjson.loads(hit)
+                        return final_text, scores, summary, quotes
+            resp = client.chat.completions.create(
+                model=model,
+                response_format={"type": "json_object"},
+                messages=[
+                    {"role": "system", "content": sys_text},
+                    {"role": "user", "content": user_text},
+                ],
+                temperature=temperature,
+            )
+            content = resp.choices[0].message.content or "{}"
+        data = orjson.loads(content)
+        # an answer without rubric rows is not worth replaying; let the next request retry
+        if fresh and isinstance(data, dict) and data.get("writing"):
+            cache_store(key, content)
+    except Exception as e:
+        return _degraded_result(e, rubric)
+
+    result = _render_feedback(data, rubric)
+    if semantic_ns and semantic_vec is not None and data.get("writing"):
+        semantic_store(semantic_ns, semantic_vec, orjson.dumps(result).decode())
+    return result
+
+
+# ---------- batch grading ----------
+
+class AsyncTokenBucket:
+    """Client-side limiter for OpenAI's per-minute request (RPM) and token (TPM) quotas.
+
+    Both buckets refill continuously; acquire() waits until one request and the estimated
+    tokens are available, so a burst stays under the quota instead of drawing 429s.
+    """
+
+    def __init__(self, rpm: float, tpm: float) -> None:
+        self.rpm = float(rpm)
+        self.tpm = float(tpm)
+        self.request_tokens = self.rpm
+        self.token_tokens = self.tpm
+        self.last = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        elapsed = now - self.last
+        self.last = now
+        self.request_tokens = min(self.rpm, self.request_tokens + elapsed * self.rpm / 60.0)
+        self.token_tokens = min(self.tpm, self.token_tokens + elapsed * self.tpm / 60.0)
+
+    async def acquire(self, estimated_tokens: int) -> None:
+        need = min(float(estimated_tokens), self.tpm)  # an oversized prompt must still get through
+        async with self._lock:
+            while True:
+                self._refill()
+                if self.request_tokens >= 1 and self.token_tokens >= need:
+                    self.request_tokens -= 1
+                    self.token_tokens -= need
+                    return
+                wait_time = max(
+                    (1 - self.request_tokens) * 60.0 / self.rpm,
+                    (need - self.token_tokens) * 60.0 / self.tpm,
+                )
+                await asyncio.sleep(wait_time)
+
+
+async def _score_one(
+    client: Any,
+    sem: asyncio.Semaphore,
+    bucket: AsyncTokenBucket,
+    text: str,
+    rubric: List[Dict[str, Any]],
+) -> Tuple[str, Dict[str, Any], str, List[str]]:
+    text = (text or "").strip()
+    if not text:
+        return generate_feedback(text, rubric)
+    sys_text, user_text = _build_messages(text, rubric)
+    try:
+        model = os.getenv("OPENAI_CHAT_MODEL", "gpt-4o-mini")
+        key = cache_key(model, _TEMPERATURE, sys_text, user_text)
+        content = cache_lookup(key)
+        fresh = content is None
+        if fresh:
+            async with sem:
+                # rough prompt size (~4 chars/token) plus headroom for the JSON reply
+                await bucket.acquire((len(sys_text) + len(user_text)) // 4 + 2000)
+                resp = await client.chat.completions.create(
+                    model=model,
+                    response_format={"type": "json_object"},
+                    messages=[
+                        {"role": "system", "content": sys_text},
+                        {"role": "user", "content": user_text},
+                    ],
+                    temperature=_TEMPERATURE,
+                )
+            content = resp.choices[0].message.content or "{}"
+        data = orjson.loads(content)
+        # an answer without rubric rows is not worth replaying; let the next request retry
+        if fresh and isinstance(data, dict) and data.get("writing"):
+            cache_store(key, content)
+    except Exception as e:
+        return _degraded_result(e, rubric)
+    return _render_feedback(data, rubric)
+
 
-            #  Why / Improve / Evidence
-            row = [f" **{name}**: {s:.1f}/{t:.1f}"]
-            if rationale:
-                row.append(f"  - **Why**: {rationale}")
-            if sug and sug.lower() != "none":
-                row.append(f"  - **Improve**: {sug}")
-            quotes = [q for q in (w.get('evidence_quotes') or []) if isinstance(q, str)]
-            if quotes:
-                row.append("  - **Evidence**: " + " | ".join(f"“{q.strip()}”" for q in quotes[:2]))
-            body += row
+def _load_checkpoint(path: Path, digests: List[str]) -> Dict[int, Tuple[str, Dict[str, Any], str, List[str]]]:
+    done: Dict[int, Tuple[str, Dict[str, Any], str, List[str]]] = {}
+    if not path.exists():
+        return done
+    for line in path.read_text(encoding="utf-8").splitlines():
+        try:
+            rec = orjson.loads(line)
+            i = int(rec["index"])
+            # only reuse a row if it was produced for the same text at the same position
+            if 0 <= i < len(digests) and rec.get("sha256") == digests[i]:
+                done[i] = tuple(rec["result"])
         except Exception:
             continue
+    return done
 
 
-    final_text = "\n".join(lines + [""] + body).strip()
-    summary = str((data.get("overall") or {}).get("notes") or "").strip() or ""
-    return final_text, (scores or _build_scores_skeleton(rubric)), summary, evidence_quotes
+async def agenerate_feedback_batch(
+    messages: List[str],
+    rubric: List[Dict[str, Any]],
+    checkpoint: str | Path | None = None,
+) -> List[Tuple[str, Dict[str, Any], str, List[str]]]:
+    """Score many reports concurrently; results come back in input order.
+
+    At most FEEDBACK_CONCURRENCY (default 16) completions are in flight over one shared
+    AsyncOpenAI client, paced by an AsyncTokenBucket sized from OPENAI_RPM / OPENAI_TPM.
+    With checkpoint, finished rows are appended to that JSONL file as they complete and
+    reused on the next run, so an interrupted batch resumes.
+    """
+    api_key = os.getenv("OPENAI_API_KEY", "").strip()
+    if not api_key and cache_mode() != "replay":
+        return [generate_feedback(m, rubric) for m in messages]
+
+    digests = [hashlib.sha256((m or "").encode("utf-8")).hexdigest() for m in messages]
+    ckpt = Path(checkpoint) if checkpoint else None
+    done = _load_checkpoint(ckpt, digests) if ckpt else {}
+    results: List[Any] = [done.get(i) for i in range(len(messages))]
+
+    # one async client per batch: it is bound to the event loop asyncio.run() creates,
+    # so unlike the sync client it cannot be kept across batches. Keyless replay never
+    # reaches the API (a cache miss raises), so it runs without one
+    client: Any = None
+    if api_key:
+        from openai import AsyncOpenAI
+        client = AsyncOpenAI(api_key=api_key, timeout=60.0, max_retries=2)
+    sem = asyncio.Semaphore(max(1, int(os.getenv("FEEDBACK_CONCURRENCY", "16"))))
+    bucket = AsyncTokenBucket(
+        max(1.0, float(os.getenv("OPENAI_RPM", "500"))),
+        max(1.0, float(os.getenv("OPENAI_TPM", "200000"))),
+    )
+    ckpt_file = ckpt.open("a", encoding="utf-8") if ckpt else None
+
+    async def run(i: int) -> None:
+        res = await _score_one(client, sem, bucket, messages[i], rubric)
+        results[i] = res
+        if ckpt_file is not None:
+            ckpt_file.write(orjson.dumps({"index": i, "sha256": digests[i], "result": res}).decode() + "\n")
+            ckpt_file.flush()
+
+    try:
+        await asyncio.gather(*(run(i) for i in range(len(messages)) if results[i] is None))
+    finally:
+        if ckpt_file is not None:
+            ckpt_file.close()
+        # release the httpx pool while its event loop is still running
+        if client is not None:
+            await client.close()
+    return results
+
+
+def generate_feedback_batch(
+    messages: List[str],
+    rubric: List[Dict[str, Any]],
+    checkpoint: str | Path | None = None,
+) -> List[Tuple[str, Dict[str, Any], str, List[str]]]:
+    """Blocking wrapper around agenerate_feedback_batch for scripts and RQ jobs."""
+    return asyncio.run(agenerate_feedback_batch(messages, rubric, checkpoint))
@@ -0,0 +1,140 @@
+from __future__ import annotations
+
+import hashlib
+import math
+import operator
+import os
+import sqlite3
+import threading
+import time
+from array import array
+from pathlib import Path
+from typing import List, Sequence
+
+# Content-addressed store for raw LLM response text, keyed by sha256(model, temperature, prompts).
+# FEEDBACK_CACHE_MODE: "enabled" (default) reads through and stores misses,
+# "replay" serves only cached responses and raises CacheMiss otherwise, "disabled" bypasses it.
+CACHE_PATH = Path(os.getenv("LLM_CACHE_PATH", "").strip() or Path(__file__).resolve().parent / "data" / "llm_cache.sqlite3")
+
+# Optional near-duplicate layer: FEEDBACK_SEMANTIC_CACHE=1 reuses a stored result when the
+# embedding of a new submission has cosine >= FEEDBACK_SEMANTIC_THRESHOLD with a prior one
+SEMANTIC_SCAN_LIMIT = 2000
+
+_local = threading.local()
+
+
+class CacheMiss(RuntimeError):
+    """Raised in replay mode when a prompt has no cached response."""
+
+
+def cache_mode() -> str:
+    mode = os.getenv("FEEDBACK_CACHE_MODE", "enabled").strip().lower()
+    return mode if mode in ("enabled", "replay", "disabled") else "enabled"
+
+
+def cache_key(model: str, temperature: float, sys_text: str, user_text: str) -> str:
+    h = hashlib.sha256()
+    for part in (model, repr(float(temperature)), sys_text, user_text):
+        h.update(part.encode("utf-8"))
+        h.update(b"\x00")  # field separator so adjacent parts can't run together
+    return h.hexdigest()
+
+
+def _conn() -> sqlite3.Connection:
+    # one connection per thread; sqlite3 connections must not cross threads
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        CACHE_PATH.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(CACHE_PATH, timeout=5, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS llm_cache ("
+            "key TEXT PRIMARY KEY, content TEXT NOT NULL, created_at REAL NOT NULL)"
+        )
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS semantic_cache ("
+            "id INTEGER PRIMARY KEY, namespace TEXT NOT NULL, embedding BLOB NOT NULL, "
+            "result TEXT NOT NULL, created_at REAL NOT NULL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS ix_semantic_ns ON semantic_cache (namespace, id)")
+        _local.conn = conn
+    return conn
+
+
+def cache_lookup(key: str) -> str | None:
+    """Return the cached response for key, or None if the caller should hit the API."""
+    mode = cache_mode()
+    if mode == "disabled":
+        return None
+    try:
+        row = _conn().execute("SELECT content FROM llm_cache WHERE key = ?", (key,)).fetchone()
+    except sqlite3.Error:
+        row = None
+    if row is not None:
+        return row[0]
+    if mode == "replay":
+        raise CacheMiss(f"no cached LLM response for {key[:12]} (FEEDBACK_CACHE_MODE=replay)")
+    return None
+
+
+def cache_store(key: str, content: str) -> None:
+    if cache_mode() == "disabled":
+        return
+    try:
+        _conn().execute(
+            "INSERT OR REPLACE INTO llm_cache (key, content, created_at) VALUES (?, ?, ?)",
+            (key, content, time.time()),
+        )
+    except sqlite3.Error:
+        pass
+
+
+def semantic_enabled() -> bool:
+    return cache_mode() != "disabled" and os.getenv("FEEDBACK_SEMANTIC_CACHE", "").strip() == "1"
+
+
+def _semantic_threshold() -> float:
+    try:
+        return float(os.getenv("FEEDBACK_SEMANTIC_THRESHOLD", "0.95"))
+    except ValueError:
+        return 0.95
+
+
+def _unit(vec: Sequence[float]) -> array:
+    norm = math.sqrt(sum(x * x for x in vec)) or 1.0
+    return array("f", (x / norm for x in vec))
+
+
+def semantic_lookup(namespace: str, vec: Sequence[float]) -> str | None:
+    """Return the stored result of the most similar prior submission in namespace, if close enough."""
+    q = _unit(vec)
+    best, best_sim = None, _semantic_threshold()
+    try:
+        rows = _conn().execute(
+            "SELECT embedding, result FROM semantic_cache WHERE namespace = ? ORDER BY id DESC LIMIT ?",
+            (namespace, SEMANTIC_SCAN_LIMIT),
+        ).fetchall()
+    except sqlite3.Error:
+        return None
+    for blob, result in rows:
+        emb = array("f")
+        emb.frombytes(blob)
+        if len(emb) != len(q):
+            continue
+        sim = sum(map(operator.mul, q, emb))
+        if sim >= best_sim:
+            best, best_sim = result, sim
+    return best
+
+
+def semantic_store(namespace: str, vec: List[float], result: str) -> None:
+    if cache_mode() != "enabled":
+        return
+    try:
+        _conn().execute(
+            "INSERT INTO semantic_cache (namespace, embedding, result, created_at) VALUES (?, ?, ?, ?)",
+            (namespace, _unit(vec).tobytes(), result, time.time()),
+        )
+    except sqlite3.Error:
+        pass
@@ -0,0 +1,39 @@
+from __future__ import annotations
+
+import os
+from functools import lru_cache
+from typing import Any
+
+# Shared sync client, built on first use so its HTTP connection pool is reused across requests
+_CLIENT: Any = None
+
+
+def get_client() -> Any:
+    global _CLIENT
+    if _CLIENT is None:
+        from openai import OpenAI
+        _CLIENT = OpenAI(api_key=os.getenv("OPENAI_API_KEY", "").strip(), timeout=60.0, max_retries=2)
+    return _CLIENT
+
+
+@lru_cache(maxsize=4)
+def _encoder(model: str) -> Any:
+    try:
+        import tiktoken
+        try:
+            return tiktoken.encoding_for_model(model)
+        except KeyError:
+            return tiktoken.get_encoding("o200k_base")
+    except Exception:
+        # tiktoken missing or its BPE file unreachable (offline host); remembered per process
+        return None
+
+
+def clip_tokens(text: str, max_tokens: int) -> str:
+    """First max_tokens tokens of text, falling back to ~4 chars/token without tiktoken."""
+    enc = _encoder(os.getenv("OPENAI_CHAT_MODEL", "gpt-4o-mini"))
+    if enc is None:
+        return text[:max_tokens * 4]
+    # only encode a generous prefix so huge uploads don't get tokenized in full
+    ids = enc.encode(text[:max_tokens * 8], disallowed_special=())
+    return enc.decode(ids[:max_tokens])
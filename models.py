@@ -1,7 +1,8 @@
 from __future__ import annotations
 
-from datetime import datetime
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import DDL, event, func, text
+from sqlalchemy.dialects.postgresql import JSONB
 
 db = SQLAlchemy()
 
@@ -12,11 +13,23 @@ class Account(db.Model):
     username = db.Column(db.String(128), unique=True, nullable=False)
     password_hash = db.Column(db.String(255), nullable=False)
     role = db.Column(db.String(32), default="student")
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    created_at = db.Column(db.DateTime, default=func.now(), server_default=func.now())
 
 
 class Interaction(db.Model):
     __tablename__ = "interaction"
+    __table_args__ = (
+        # serves the per-user history / last-feedback lookups (newest first)
+        db.Index(
+            "ix_inter_user_time",
+            "user_id",
+            "feedback_time",
+            postgresql_where=text("feedback_text IS NOT NULL"),
+            sqlite_where=text("feedback_text IS NOT NULL"),
+        ),
+        # per-student listings by creation time; its leading column also covers plain user_id lookups
+        db.Index("ix_interaction_user_created", "user_id", "created_at"),
+    )
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey("account.id"), nullable=False)
 
@@ -27,19 +40,28 @@ class Interaction(db.Model):
     feedback_summary = db.Column(db.Text)
     feedback_time = db.Column(db.DateTime)
 
-    scores_json = db.Column(db.Text)  # writing rubric scores per category
+    scores_json = db.Column(db.JSON().with_variant(JSONB(), "postgresql"))  # writing rubric scores per category
 
     rating = db.Column(db.Integer)
     student_feedback_text = db.Column(db.Text)
 
-    status = db.Column(db.String(32), default="final")  # draft/final
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    status = db.Column(db.String(32), default="final", index=True)  # draft/pending/final/error
+    created_at = db.Column(db.DateTime, default=func.now(), server_default=func.now(), index=True)
+    updated_at = db.Column(db.DateTime, default=func.now(), server_default=func.now(), onupdate=func.now())
+
+
+# GIN index for server-side key/containment queries on the JSONB scores; PostgreSQL only,
+# since on SQLite the column is plain JSON text and a btree over it would be useless
+event.listen(
+    Interaction.__table__,
+    "after_create",
+    DDL("CREATE INDEX IF NOT EXISTS ix_scores_gin ON interaction USING gin (scores_json)").execute_if(dialect="postgresql"),
+)
 
 
 class RubricVersion(db.Model):
     __tablename__ = "rubric_version"
     id = db.Column(db.Integer, primary_key=True)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    created_at = db.Column(db.DateTime, default=func.now(), server_default=func.now(), index=True)
     created_by = db.Column(db.Integer, db.ForeignKey("account.id"))
     rubric_json = db.Column(db.Text, nullable=False)
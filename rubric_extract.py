@@ -1,10 +1,34 @@
 from __future__ import annotations
 
-import json
 import os
 import re
 from typing import Any, Dict, List
 
+import orjson
+
+from llm_client import clip_tokens, get_client
+
+# Heading / "N points: ..." / "N: ..." line patterns for the heuristic extractor
+_CAT_RE = re.compile(r"^([A-Z][A-Za-z0-9 ,/&()\-]{3,})\s*(?:\([^)]+\))?\s*[:\-]?$")
+_CRIT_RE1 = re.compile(r"^(?:-\s*)?(\d{1,2})\s*(?:points?|pts?)\s*[:\-]\s*(.+)$", re.I)
+_CRIT_RE2 = re.compile(r"^(?:-\s*)?(\d{1,2})\s*[:\-]\s*(.+)$")
+_NUM_RE = re.compile(r"([0-9]+(?:\.[0-9]+)?)")
+_WS_RE = re.compile(r"\s+")
+_RUBRIC_RE = re.compile(r"rubric", re.I)
+
+# Example output shape shown to the model
+_FORMAT_EXAMPLE = [
+    {"name": "Executive Summary", "scoringCriteria": [
+        {"points": 4, "description": "Clear problem, approach, key results, and recommendation."},
+        {"points": 3, "description": "Mostly clear; minor missing elements."}
+    ]}
+]
+
+# Bulk extraction packs up to this many syllabi into one completion, each clipped harder
+# (1500 tokens, about 6000 characters) so a full batch stays within a normal prompt size
+_BATCH_SIZE = 8
+_BATCH_EXCERPT_TOKENS = 1500
+
 
 def _normalize_item(name: str, criteria: List[Dict[str, Any]]) -> Dict[str, Any]:
     name = (name or "").strip()
@@ -15,7 +39,7 @@ def _normalize_item(name: str, criteria: List[Dict[str, Any]]) -> Dict[str, Any]
         try:
             pts = float(c.get("points"))
         except Exception:
-            m = re.search(r"([0-9]+(?:\.[0-9]+)?)", str(c.get("points") or ""))
+            m = _NUM_RE.search(str(c.get("points") or ""))
             pts = float(m.group(1)) if m else 0.0
         desc = str(c.get("description") or "").strip()
         key = (pts, desc)
@@ -38,14 +62,12 @@ def _heuristic_extract(text: str) -> List[Dict[str, Any]]:
     """Lightweight heuristic extraction when LLM is not available.
     Attempts to find rubric-like sections and build items with 0..max levels.
     """
-    lines = [re.sub(r"\s+", " ", ln.strip()) for ln in text.splitlines()]
-    # Narrow to a window after the word "rubric" if present
-    joined = "\n".join(lines)
-    idx = re.search(r"rubric", joined, re.I)
+    # Narrow to a window after the word "rubric" if present, then split/normalize that slice once
+    idx = _RUBRIC_RE.search(text)
     if idx:
         start = max(0, idx.start() - 200)
-        joined = joined[start:start + 8000]
-        lines = joined.splitlines()
+        text = text[start:start + 8000]
+    lines = [_WS_RE.sub(" ", ln.strip()) for ln in text.splitlines()]
 
     items: List[Dict[str, Any]] = []
     current_name: str | None = None
@@ -57,28 +79,24 @@ def _heuristic_extract(text: str) -> List[Dict[str, Any]]:
             items.append(_normalize_item(current_name, current_criteria))
         current_name, current_criteria = None, []
 
-    cat_re = re.compile(r"^([A-Z][A-Za-z0-9 ,/&()\-]{3,})\s*(?:\([^)]+\))?\s*[:\-]?$")
-    crit_re1 = re.compile(r"^(?:-\s*)?(\d{1,2})\s*(?:points?|pts?)\s*[:\-]\s*(.+)$", re.I)
-    crit_re2 = re.compile(r"^(?:-\s*)?(\d{1,2})\s*[:\-]\s*(.+)$")
-
     for ln in lines:
         if not ln:
             continue
-        m = cat_re.match(ln)
+        m = _CAT_RE.match(ln)
         if m and len(ln.split()) <= 8:
             # Treat as a new category heading
             push()
             current_name = m.group(1).strip()
             continue
 
-        m1 = crit_re1.match(ln)
+        m1 = _CRIT_RE1.match(ln)
         if m1 and current_name:
             pts = float(m1.group(1))
             desc = m1.group(2).strip()
             current_criteria.append({"points": pts, "description": desc})
             continue
 
-        m2 = crit_re2.match(ln)
+        m2 = _CRIT_RE2.match(ln)
         if m2 and current_name:
             pts = float(m2.group(1))
             desc = m2.group(2).strip()
@@ -111,22 +129,16 @@ def _llm_extract(text: str) -> List[Dict[str, Any]] | None:
     if not api_key:
         return None
     try:
-        from openai import OpenAI
-        client = OpenAI(api_key=api_key)
+        client = get_client()
         sys = (
             "You extract grading rubrics for technical report writing from syllabi. "
             "Return ONLY a JSON array. Each item: {name, scoringCriteria:[{points:number, description:string}]}. "
             "Prefer 3-6 clear items; keep descriptions short and concrete."
         )
-        user = json.dumps({
-            "syllabus_excerpt": text[:12000],
-            "format": [
-                {"name": "Executive Summary", "scoringCriteria": [
-                    {"points": 4, "description": "Clear problem, approach, key results, and recommendation."},
-                    {"points": 3, "description": "Mostly clear; minor missing elements."}
-                ]}
-            ]
-        }, ensure_ascii=False)
+        user = orjson.dumps({
+            "syllabus_excerpt": clip_tokens(text, 3000),
+            "format": _FORMAT_EXAMPLE,
+        }).decode()
         resp = client.chat.completions.create(
             model=os.getenv("OPENAI_CHAT_MODEL", "gpt-4o-mini"),
             response_format={"type": "json_object"},
@@ -137,7 +149,7 @@ def _llm_extract(text: str) -> List[Dict[str, Any]] | None:
             temperature=0.2,
         )
         content = resp.choices[0].message.content or ""
-        data = json.loads(content)
+        data = orjson.loads(content)
         arr = data if isinstance(data, list) else data.get("rubric") if isinstance(data, dict) else None
         if isinstance(arr, list) and arr:
             cleaned = [_normalize_item(str(x.get("name") or ""), x.get("scoringCriteria") or []) for x in arr]
@@ -147,6 +159,52 @@ def _llm_extract(text: str) -> List[Dict[str, Any]] | None:
         return None
 
 
+def _llm_extract_batch(texts: List[str]) -> List[List[Dict[str, Any]] | None]:
+    """One completion per _BATCH_SIZE syllabi; None for any the model skipped or that failed."""
+    out: List[List[Dict[str, Any]] | None] = [None] * len(texts)
+    api_key = os.getenv("OPENAI_API_KEY", "").strip()
+    if not api_key:
+        return out
+    client = get_client()
+    sys = (
+        "You extract grading rubrics for technical report writing from several syllabi. "
+        "Return ONLY a JSON object {\"rubrics\": [{\"id\": number, \"rubric\": [...]}]} with one entry per syllabus id. "
+        "Each rubric item: {name, scoringCriteria:[{points:number, description:string}]}. "
+        "Prefer 3-6 clear items per syllabus; keep descriptions short and concrete."
+    )
+    for start in range(0, len(texts), _BATCH_SIZE):
+        ids = [i for i in range(start, min(start + _BATCH_SIZE, len(texts))) if texts[i]]
+        if not ids:
+            continue
+        user = orjson.dumps({
+            "syllabi": [{"id": i, "excerpt": clip_tokens(texts[i], _BATCH_EXCERPT_TOKENS)} for i in ids],
+            "format": _FORMAT_EXAMPLE,
+        }).decode()
+        try:
+            resp = client.chat.completions.create(
+                model=os.getenv("OPENAI_CHAT_MODEL", "gpt-4o-mini"),
+                response_format={"type": "json_object"},
+                messages=[
+                    {"role": "system", "content": sys},
+                    {"role": "user", "content": user},
+                ],
+                temperature=0.2,
+            )
+            data = orjson.loads(resp.choices[0].message.content or "")
+        except Exception:
+            continue
+        entries = data.get("rubrics") if isinstance(data, dict) else None
+        for entry in entries if isinstance(entries, list) else []:
+            try:
+                i = int(entry.get("id"))
+                arr = entry.get("rubric")
+                if i in ids and isinstance(arr, list) and arr:
+                    out[i] = [_normalize_item(str(x.get("name") or ""), x.get("scoringCriteria") or []) for x in arr]
+            except Exception:
+                continue
+    return out
+
+
 def extract_rubric_from_text(text: str) -> List[Dict[str, Any]]:
     """Extract rubric items from syllabus text.
     Uses LLM when available, else a lightweight heuristic.
@@ -159,3 +217,11 @@ def extract_rubric_from_text(text: str) -> List[Dict[str, Any]]:
         return llm
     return _heuristic_extract(text)
 
+
+def extract_rubrics_from_texts(texts: List[str]) -> List[List[Dict[str, Any]]]:
+    """Bulk variant of extract_rubric_from_text for many syllabi at once.
+    Batches the LLM calls; any syllabus the model skipped falls back to the heuristic.
+    """
+    texts = [(t or "").strip() for t in texts]
+    llm = _llm_extract_batch(texts)
+    return [(r or _heuristic_extract(t)) if t else [] for t, r in zip(texts, llm)]
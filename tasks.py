@@ -0,0 +1,32 @@
+from __future__ import annotations
+
+from datetime import datetime, timezone
+
+from app import _load_rubric, app
+from feedback_tech import generate_feedback
+from models import db, Interaction
+
+
+def generate_feedback_task(rid: int) -> None:
+    """RQ job: score a pending Interaction and store the result on the row."""
+    with app.app_context():
+        rec = db.session.get(Interaction, rid)
+        if rec is None or rec.status != "pending":
+            return
+        try:
+            feedback_text, scores, feedback_summary, _quotes = generate_feedback(
+                message=rec.prompt_text or "",
+                rubric=_load_rubric(),
+                owner=str(rec.user_id),
+            )
+        except Exception as e:
+            rec.status = "error"
+            rec.feedback_summary = f"Model error: {e}"
+            db.session.commit()
+            return
+        rec.feedback_text = feedback_text
+        rec.feedback_summary = feedback_summary
+        rec.scores_json = scores
+        rec.feedback_time = datetime.now(timezone.utc)
+        rec.status = "final"
+        db.session.commit()